@@ -1,3 +1,5 @@
+import numpy as np
+import tensorflow as tf
 from tensorflow.keras.models import Model
 from tensorflow.keras.layers import (
     ZeroPadding2D,
@@ -17,8 +19,10 @@ class ArcFaceClient():
     ArcFace model class
     """
 
-    def __init__(self):
-        self.model = load_model()
+    def __init__(self, optimized=False, jit_compile=False):
+        # optimized=True swaps in the BatchNorm-folded, tf.function-compiled graph;
+        # it exposes the same predict(x, verbose=False) call as a Keras model
+        self.model = load_inference_model(jit_compile=jit_compile) if optimized else load_model()
         self.model_name = "ArcFace"
         self.input_shape = (112, 112)
         self.output_shape = 512
@@ -129,4 +133,164 @@ def stack_fn(x):
     x = stack1(x, 256, 6, name="conv4")
     return stack1(x, 512, 3, name="conv5")
 
-#model = load_model()
\ No newline at end of file
+
+# ---------------------------------------
+# Inference-only graph
+# ---------------------------------------
+
+BN_EPSILON = 2e-5
+
+
+def _bn_scale_shift(bn_layer):
+    """
+    Per-channel (scale, shift) such that bn(x) == x * scale + shift at inference
+    """
+    gamma, beta, mean, variance = bn_layer.get_weights()
+    scale = gamma / np.sqrt(variance + bn_layer.epsilon)
+    return scale, beta - mean * scale
+
+
+def _fold_conv_bn(conv_layer, bn_layer):
+    """
+    Returns:
+        [kernel, bias] of a convolution equivalent to conv followed by bn
+    """
+    kernel = conv_layer.get_weights()[0]
+    scale, shift = _bn_scale_shift(bn_layer)
+    return [kernel * scale, shift]
+
+
+def _fused_conv(x, filters, kernel_size, stride, name):
+    # Explicit 1-pixel padding + 'valid' equals 'same' only for stride 1; the
+    # stride-2 convolutions keep their ZeroPadding2D (TF's 'same' pads asymmetrically)
+    if kernel_size == 1:
+        padding = "valid"
+    elif stride == 1:
+        padding = "same"
+    else:
+        x = ZeroPadding2D(padding=1, name=name + "_pad")(x)
+        padding = "valid"
+    return Conv2D(filters, kernel_size, strides=stride, padding=padding, use_bias=True, name=name)(x)
+
+
+def _fused_block1(x, filters, kernel_size=3, stride=1, conv_shortcut=True, name=None):
+    if conv_shortcut:
+        shortcut = _fused_conv(x, filters, 1, stride, name + "_0_conv")
+    else:
+        shortcut = x
+
+    # _1_bn precedes a zero-padded convolution, so folding it would change the
+    # border pixels; it stays as a (cheap, inference-mode) BatchNormalization
+    x = BatchNormalization(axis=3, epsilon=BN_EPSILON, name=name + "_1_bn")(x)
+    x = _fused_conv(x, filters, 3, 1, name + "_1_conv")
+    x = PReLU(shared_axes=[1, 2], name=name + "_1_prelu")(x)
+    x = _fused_conv(x, filters, kernel_size, stride, name + "_2_conv")
+    return Add(name=name + "_add")([shortcut, x])
+
+
+def _build_fused_graph():
+    img_input = Input(shape=(112, 112, 3))
+    x = _fused_conv(img_input, 64, 3, 1, "conv1_conv")
+    x = PReLU(shared_axes=[1, 2], name="conv1_prelu")(x)
+    for stack_name, filters, blocks in (("conv2", 64, 3), ("conv3", 128, 4),
+                                        ("conv4", 256, 6), ("conv5", 512, 3)):
+        x = _fused_block1(x, filters, stride=2, name=stack_name + "_block1")
+        for i in range(2, blocks + 1):
+            x = _fused_block1(x, filters, conv_shortcut=False, name=stack_name + "_block" + str(i))
+    x = Flatten()(x)
+    embedding = Dense(512, use_bias=True, name="embedding")(x)
+    return Model(img_input, embedding, name="ArcFaceInference")
+
+
+def fold_model(model):
+    """
+    Build the inference graph and copy the trained weights into it, folding
+    every BatchNormalization that follows a Conv2D into that convolution,
+    the two head BatchNormalizations into the Dense layer, and dropping Dropout
+    Returns:
+        fused (Model)
+    """
+    fused = _build_fused_graph()
+    layers = {layer.name: layer for layer in model.layers}
+
+    for layer in fused.layers:
+        name = layer.name
+        if isinstance(layer, Conv2D):
+            # conv1_conv -> conv1_bn, <block>_0_conv -> _0_bn, _1_conv -> _2_bn, _2_conv -> _3_bn
+            if name == "conv1_conv":
+                bn_name = "conv1_bn"
+            else:
+                block, index = name[:-len("_0_conv")], int(name[-len("0_conv")])
+                bn_name = f"{block}_{index + 1 if index else 0}_bn"
+            layer.set_weights(_fold_conv_bn(layers[name], layers[bn_name]))
+        elif isinstance(layer, (PReLU, BatchNormalization)):
+            layer.set_weights(layers[name].get_weights())
+
+    # Head: BN (on the 7x7x512 map) -> Dropout -> Flatten -> Dense -> BN "embedding"
+    dropout_index = next(i for i, layer in enumerate(model.layers) if isinstance(layer, Dropout))
+    head_scale, head_shift = _bn_scale_shift(model.layers[dropout_index - 1])
+    dense = next(layer for layer in model.layers if isinstance(layer, Dense))
+    kernel, bias = dense.get_weights()
+    spatial = kernel.shape[0] // head_scale.shape[0]
+    # Flatten is channels-last, so the per-channel affine repeats every `channels` inputs
+    kernel_scale = np.tile(head_scale, spatial)
+    bias = bias + np.tile(head_shift, spatial) @ kernel
+    kernel = kernel * kernel_scale[:, None]
+
+    out_scale, out_shift = _bn_scale_shift(layers["embedding"])
+    fused.get_layer("embedding").set_weights([kernel * out_scale, bias * out_scale + out_shift])
+    return fused
+
+
+class InferenceArcFace:
+    """
+    tf.function wrapper around the folded graph with a fixed input signature,
+    so it is traced once; predict() mirrors Model.predict(x, verbose=False)
+    """
+
+    def __init__(self, fused_model, jit_compile=False):
+        self.model = fused_model
+        self._infer = tf.function(
+            lambda x: fused_model(x, training=False),
+            input_signature=[tf.TensorSpec(shape=(None, 112, 112, 3), dtype=tf.float32)],
+            jit_compile=jit_compile,
+        )
+
+    def __call__(self, x):
+        return self._infer(tf.convert_to_tensor(x, dtype=tf.float32))
+
+    def predict(self, x, verbose=False):
+        return self(x).numpy()
+
+
+def verify_inference_model(model, inference_model, samples=4, rtol=1e-3):
+    """
+    Compare embeddings of the original and optimized models on random faces
+    Returns:
+        max_relative_error (float)
+    """
+    rng = np.random.default_rng(0)
+    faces = rng.uniform(0, 255, size=(samples, 112, 112, 3)).astype(np.float32)
+    expected = model.predict(faces, verbose=False)
+    actual = inference_model.predict(faces)
+    error = float(np.max(np.abs(expected - actual)) / (np.max(np.abs(expected)) + 1e-12))
+    if error > rtol:
+        raise ValueError(f"Optimized ArcFace differs from the original model (relative error {error:.2e})")
+    return error
+
+
+def load_inference_model(model=None, jit_compile=False, verify=True):
+    """
+    Inference-optimized ArcFace: BatchNorm folded into the convolutions and the
+    embedding Dense layer, Dropout removed, stride-1 padding merged into the
+    convolutions, wrapped in a tf.function (optionally XLA-compiled)
+    Returns:
+        model (InferenceArcFace)
+    """
+    if model is None:
+        model = load_model()
+    inference_model = InferenceArcFace(fold_model(model), jit_compile=jit_compile)
+    if verify:
+        error = verify_inference_model(model, inference_model)
+        print(f"INFO: Optimized ArcFace matches the original model (relative error {error:.2e}).")
+    return inference_model
@@ -0,0 +1,191 @@
+"""
+Compact `Face Recognition.csv` into a few float16 prototypes per identity.
+
+Enrollment keeps every fifth frame of a video, so each person contributes
+hundreds of nearly identical 512-float rows that are all scanned at match
+time. This tool keeps, per identity, the enrollment embedding closest to the
+mean plus the enrollment embeddings that the prototypes chosen so far do not
+cover (farthest-point selection), until every enrollment embedding is within
+`--coverage` cosine distance of a prototype or `--max-prototypes` is reached.
+`--method kmedoids` uses k-medoids on cosine distance instead.
+
+Both methods keep only real enrollment embeddings. Ignoring float16
+rounding, an impostor who is not in the gallery and falls within the threshold
+of a prototype was already within it of an enrolled row, so such impostors
+gain no false accepts. Compaction can still lose true matches. A known face
+whose nearest enrolled row was dropped may now be closest to another person's
+prototype, so the report counts held-out faces whose identity changes.
+Accuracy before and after is reported on held-out embeddings, either from
+`--holdout-csv` (same format as the enrollment CSV) or a random
+`--holdout-fraction` of each identity's rows. Random rows are often neighbouring
+frames of the same video, so that accuracy is optimistic. The false-accept
+rate leaves each identity out of the gallery in turn and expects its faces to
+come back "Unknown". It needs at least two identities.
+
+Usage:
+    python compact_gallery.py "Face Recognition.csv" gallery.npz --holdout-fraction 0.2
+"""
+import argparse
+
+import numpy as np
+
+from recognition import Gallery, normalize_rows, RECOGNITION_THRESHOLD
+
+
+def cover_prototypes(embeddings, max_prototypes, coverage):
+    """
+    Embedding closest to the mean direction plus the farthest uncovered embeddings
+    """
+    center = int(np.argmax(embeddings @ normalize_rows(embeddings.mean(axis=0))))
+    prototypes = [embeddings[center]]
+    closest = 1.0 - embeddings @ prototypes[0]
+    while len(prototypes) < max_prototypes:
+        farthest = int(np.argmax(closest))
+        if closest[farthest] <= coverage:
+            break
+        prototypes.append(embeddings[farthest])
+        closest = np.minimum(closest, 1.0 - embeddings @ embeddings[farthest])
+    return np.stack(prototypes)
+
+
+def kmedoids_prototypes(embeddings, k, iterations=20, seed=0):
+    """
+    k-medoids (alternating assignment / medoid update) on cosine distance
+    """
+    k = min(k, len(embeddings))
+    rng = np.random.default_rng(seed)
+    distances = 1.0 - embeddings @ embeddings.T
+    medoids = rng.choice(len(embeddings), size=k, replace=False)
+    for _ in range(iterations):
+        assignment = np.argmin(distances[:, medoids], axis=1)
+        new_medoids = medoids.copy()
+        for cluster in range(k):
+            members = np.flatnonzero(assignment == cluster)
+            if len(members) == 0:
+                continue
+            within = distances[np.ix_(members, members)].sum(axis=1)
+            new_medoids[cluster] = members[np.argmin(within)]
+        if np.array_equal(new_medoids, medoids):
+            break
+        medoids = new_medoids
+    return embeddings[medoids]
+
+
+def compact(gallery, method='cover', max_prototypes=8, coverage=0.1):
+    """
+    Returns:
+        Gallery with float16 prototypes
+    """
+    if len(gallery) == 0:
+        return Gallery(gallery.embeddings, gallery.names, dtype=np.float16)
+    prototype_rows, prototype_names = [], []
+    for name in np.unique(gallery.names):
+        embeddings = gallery.embeddings[gallery.names == name].astype(np.float32)
+        if method == 'kmedoids':
+            prototypes = kmedoids_prototypes(embeddings, max_prototypes)
+        else:
+            prototypes = cover_prototypes(embeddings, max_prototypes, coverage)
+        prototype_rows.append(prototypes)
+        prototype_names.extend([name] * len(prototypes))
+    return Gallery(np.concatenate(prototype_rows), prototype_names, dtype=np.float16)
+
+
+def split_holdout(gallery, fraction, seed=0):
+    rng = np.random.default_rng(seed)
+    holdout = np.zeros(len(gallery), dtype=bool)
+    for name in np.unique(gallery.names):
+        rows = np.flatnonzero(gallery.names == name)
+        count = int(round(len(rows) * fraction))
+        if 0 < count < len(rows):
+            holdout[rng.choice(rows, size=count, replace=False)] = True
+    keep = ~holdout
+    return (Gallery(gallery.embeddings[keep], gallery.names[keep]),
+            Gallery(gallery.embeddings[holdout], gallery.names[holdout]))
+
+
+def accuracy(gallery, holdout, threshold):
+    matches = gallery.match(holdout.embeddings, threshold)
+    predicted = np.array([name for name, _ in matches])
+    # Names missing from the gallery are expected to come back as "Unknown"
+    known = set(gallery.names.tolist())
+    expected = np.array([name if name in known else "Unknown" for name in holdout.names])
+    return float(np.mean(predicted == expected))
+
+
+def identity_changes(gallery, compacted, probes, threshold):
+    """
+    Number of probes matched to a different known person after compaction
+    (turning into "Unknown" is counted by accuracy instead)
+    """
+    before = gallery.match(probes.embeddings, threshold)
+    after = compacted.match(probes.embeddings, threshold)
+    return sum(new != "Unknown" and new != old for (old, _), (new, _) in zip(before, after))
+
+
+def false_accept_rate(gallery, probes, threshold):
+    """
+    Match each identity's probes against the gallery without that identity;
+    returns the fraction not reported as "Unknown", or None with fewer than
+    two identities
+    """
+    accepted = total = 0
+    for name in np.unique(probes.names):
+        others = gallery.names != name
+        if not others.any():
+            continue
+        rest = Gallery(gallery.embeddings[others], gallery.names[others], dtype=gallery.embeddings.dtype)
+        matches = rest.match(probes.embeddings[probes.names == name], threshold)
+        accepted += sum(match_name != "Unknown" for match_name, _ in matches)
+        total += len(matches)
+    return accepted / total if total else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact a face gallery into per-identity float16 prototypes.")
+    parser.add_argument('gallery_csv')
+    parser.add_argument('output_npz')
+    parser.add_argument('--method', choices=['cover', 'kmedoids'], default='cover')
+    parser.add_argument('--max-prototypes', type=int, default=8)
+    parser.add_argument('--coverage', type=float, default=0.1,
+                        help="Cosine distance within which an enrollment embedding counts as covered (cover method).")
+    parser.add_argument('--threshold', type=float, default=RECOGNITION_THRESHOLD)
+    parser.add_argument('--holdout-csv', help="Held-out embeddings in the enrollment CSV format.")
+    parser.add_argument('--holdout-fraction', type=float, default=0.0,
+                        help="Hold out this fraction of each identity's rows for evaluation.")
+    args = parser.parse_args()
+
+    gallery = Gallery.from_csv(args.gallery_csv)
+    holdout = None
+    if args.holdout_csv:
+        holdout = Gallery.from_csv(args.holdout_csv)
+    elif args.holdout_fraction > 0:
+        gallery, holdout = split_holdout(gallery, args.holdout_fraction)
+
+    compacted = compact(gallery, args.method, args.max_prototypes, args.coverage)
+    compacted.save_npz(args.output_npz)
+
+    print(f"Identities : {len(np.unique(gallery.names))}")
+    print(f"Rows       : {len(gallery)} -> {len(compacted)} "
+          f"({len(gallery) / max(len(compacted), 1):.1f}x fewer comparisons)")
+    # The CSV gallery is float64 once loaded by pandas, as in the notebooks
+    print(f"Memory     : {len(gallery) * gallery.embeddings.shape[1] * 8 / 1024:.1f} KB -> "
+          f"{compacted.embeddings.nbytes / 1024:.1f} KB")
+    if holdout is not None and len(holdout):
+        print(f"Held-out   : {len(holdout)} embeddings, threshold {args.threshold}")
+        print(f"Accuracy   : {accuracy(gallery, holdout, args.threshold):.2%} (full) -> "
+              f"{accuracy(compacted, holdout, args.threshold):.2%} (compacted)")
+        print(f"Changed id : {identity_changes(gallery, compacted, holdout, args.threshold)} "
+              f"held-out faces now match a different person")
+    # Without a holdout the enrollment rows themselves are the impostor probes
+    probes = holdout if holdout is not None and len(holdout) else gallery
+    full_far = false_accept_rate(gallery, probes, args.threshold)
+    if full_far is None:
+        print("FAR        : n/a (false accepts need at least two identities)")
+    else:
+        print(f"FAR        : {full_far:.2%} (full) -> "
+              f"{false_accept_rate(compacted, probes, args.threshold):.2%} (compacted) leave-one-identity-out false accepts")
+    print(f"Saved compacted gallery to {args.output_npz}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Cheap face-quality checks run before ArcFace.
+
+Tiny, blurred, dark or barely-detected faces rarely match reliably, so they
+are skipped in the live loops instead of being resized to 112x112 and
+embedded. During enrollment only the top-K sharpest, mutually distinct crops
+per person are kept.
+"""
+import cv2
+import numpy as np
+
+# Sharpness is measured on crops resized to this size so scores are comparable
+QUALITY_SIZE = (112, 112)
+
+
+def face_quality(face_img, confidence=None):
+    """
+    Returns:
+        dict with 'size' (shorter side in pixels), 'sharpness' (variance of
+        the Laplacian), 'brightness' (mean gray level) and 'confidence'
+    """
+    gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
+    size = min(gray.shape[:2])
+    gray = cv2.resize(gray, QUALITY_SIZE)
+    return {
+        'size': size,
+        'sharpness': float(cv2.Laplacian(gray, cv2.CV_64F).var()),
+        'brightness': float(gray.mean()),
+        'confidence': None if confidence is None else float(confidence),
+    }
+
+
+class QualityGate:
+    """
+    Thresholds on the cheap quality signals; check() says whether a face is
+    worth an ArcFace pass and, if not, why
+    """
+
+    def __init__(self, min_size=40, min_sharpness=60.0, min_brightness=40.0,
+                 max_brightness=220.0, min_confidence=0.5):
+        self.min_size = min_size
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.min_confidence = min_confidence
+
+    def check(self, face_img, confidence=None):
+        """
+        Returns:
+            (ok, reason, quality) where reason is None when ok
+        """
+        if face_img is None or face_img.size == 0:
+            return False, 'empty', None
+        quality = face_quality(face_img, confidence)
+        if quality['size'] < self.min_size:
+            return False, 'too small', quality
+        if quality['confidence'] is not None and quality['confidence'] < self.min_confidence:
+            return False, 'low confidence', quality
+        if not self.min_brightness <= quality['brightness'] <= self.max_brightness:
+            return False, 'bad exposure', quality
+        if quality['sharpness'] < self.min_sharpness:
+            return False, 'blurred', quality
+        return True, None, quality
+
+
+def _thumbnail(face_img):
+    gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
+    thumb = cv2.resize(gray, (16, 16), interpolation=cv2.INTER_AREA).astype(np.float32)
+    return (thumb - thumb.mean()) / (thumb.std() + 1e-6)
+
+
+def select_enrollment_faces(faces, top_k=30, min_difference=0.35):
+    """
+    Keep the top-K sharpest crops that are distinct from each other
+
+    Args:
+        faces: list of (face_img, quality) pairs that passed the gate
+        min_difference: minimum RMS difference between normalized 16x16
+            thumbnails for two crops to count as distinct
+    Returns:
+        list of face_img, sharpest first
+    """
+    ranked = sorted(faces, key=lambda item: item[1]['sharpness'], reverse=True)
+    selected, thumbnails = [], []
+    for face_img, _ in ranked:
+        thumb = _thumbnail(face_img)
+        if all(np.sqrt(np.mean((thumb - other) ** 2)) >= min_difference for other in thumbnails):
+            selected.append(face_img)
+            thumbnails.append(thumb)
+            if len(selected) >= top_k:
+                break
+    return selected
@@ -0,0 +1,90 @@
+import os
+
+import cv2
+import numpy as np
+import pandas as pd
+
+# Cosine distance below which a face is considered known (same as the notebooks)
+RECOGNITION_THRESHOLD = 0.3
+
+ARCFACE_INPUT_SIZE = (112, 112)
+
+
+def preprocess_face(face_img):
+    """
+    Resize a BGR face crop to the ArcFace input size
+    Returns:
+        face (np.ndarray) of shape (112, 112, 3), float32
+    """
+    face_img = cv2.resize(face_img, ARCFACE_INPUT_SIZE)
+    return face_img.astype(np.float32)
+
+
+def normalize_rows(embeddings):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+class Gallery:
+    """
+    Known embeddings with their names, stored L2-normalized so that cosine
+    similarity against every row is a single matrix product
+    """
+
+    def __init__(self, embeddings, names, dtype=np.float32):
+        self.embeddings = normalize_rows(embeddings).astype(dtype)
+        self.names = np.asarray(names)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a gallery from the enrollment CSV or a compacted `.npz` file
+        """
+        if os.path.splitext(path)[1].lower() == '.npz':
+            return cls.from_npz(path)
+        return cls.from_csv(path)
+
+    @classmethod
+    def from_csv(cls, csv_path):
+        """
+        Load a gallery saved by the enrollment notebook (512 columns + 'Name')
+        """
+        df = pd.read_csv(csv_path)
+        embedding_columns = df.columns.tolist()
+        embedding_columns.remove('Name')
+        return cls(df[embedding_columns].values, df['Name'].values)
+
+    @classmethod
+    def from_npz(cls, path):
+        """
+        Load a gallery written by `compact_gallery.py` (float16 prototypes)
+        """
+        data = np.load(path, allow_pickle=False)
+        return cls(data['embeddings'], data['names'], dtype=data['embeddings'].dtype)
+
+    def save_npz(self, path):
+        np.savez_compressed(path, embeddings=self.embeddings, names=self.names.astype(str))
+
+    def __len__(self):
+        return len(self.names)
+
+    def match(self, embeddings, threshold=RECOGNITION_THRESHOLD):
+        """
+        Match a batch of embeddings against the gallery
+        Returns:
+            list of (name, distance) where distance is the cosine distance
+            (1 - similarity) to the closest known embedding, and name is
+            "Unknown" if that distance is not below `threshold`
+        """
+        queries = normalize_rows(np.atleast_2d(embeddings))
+        if len(self) == 0:
+            return [("Unknown", 1.0)] * len(queries)
+        distances = 1.0 - queries @ self.embeddings.T.astype(np.float32, copy=False)
+        best = np.argmin(distances, axis=1)
+        matches = []
+        for row, idx in enumerate(best):
+            distance = float(distances[row, idx])
+            name = str(self.names[idx]) if distance < threshold else "Unknown"
+            matches.append((name, distance))
+        return matches
@@ -0,0 +1,329 @@
+"""
+Local face recognition service shared by many camera streams.
+
+One process holds a single YOLO face detector and a single ArcFace model.
+Requests from all clients are collected into micro-batches (up to
+`max_batch` items, or whatever arrived within `max_wait_ms`) so that each
+model runs one batched predict instead of many single-item calls.
+
+Endpoints (localhost HTTP):
+    POST /recognize   body: encoded image (JPEG/PNG) of a full frame
+                      -> {"faces": [{"box": [x1, y1, x2, y2], "name": ..., "distance": ...}]}
+                      Faces failing the quality gate are not embedded; they come
+                      back with "name": null and a "skipped" reason.
+    POST /embed       body: encoded image of a face crop
+                      -> {"embedding": [512 floats]}
+    GET  /metrics     -> request latency percentiles and batch-size histograms
+"""
+import argparse
+import json
+import queue
+import threading
+import time
+import urllib.request
+from collections import Counter, deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+from face_quality import QualityGate
+from recognition import Gallery, preprocess_face, RECOGNITION_THRESHOLD
+
+
+class MicroBatcher:
+    """
+    Collects single items submitted from many threads and runs `batch_fn` on
+    lists of them from one worker thread.
+
+    A batch is closed when it holds `max_batch` items or when `max_wait_ms`
+    has passed since its first item arrived, whichever comes first.
+    `batch_fn` takes a list of items and returns a list of results.
+    """
+
+    def __init__(self, batch_fn, max_batch=32, max_wait_ms=5.0, name="batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._batch_sizes = Counter()
+        self._stats_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def batch_size_histogram(self):
+        with self._stats_lock:
+            return dict(sorted(self._batch_sizes.items()))
+
+    def submit(self, item):
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            with self._stats_lock:
+                self._batch_sizes[len(batch)] += 1
+            items = [item for item, _ in batch]
+            try:
+                results = list(self.batch_fn(items))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            if len(results) != len(batch):
+                error = RuntimeError(f"{self._worker.name}: batch_fn returned {len(results)} "
+                                     f"results for {len(batch)} items")
+                for _, future in batch:
+                    future.set_exception(error)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+
+class LatencyStats:
+    """
+    Thread-safe rolling window of request latencies per endpoint
+    """
+
+    def __init__(self, window=10000):
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._counts = Counter()
+        self._window = window
+
+    def record(self, endpoint, seconds):
+        with self._lock:
+            self._latencies.setdefault(endpoint, deque(maxlen=self._window)).append(seconds)
+            self._counts[endpoint] += 1
+
+    def summary(self):
+        with self._lock:
+            summary = {}
+            for endpoint, values in self._latencies.items():
+                ms = np.array(values) * 1000.0
+                summary[endpoint] = {
+                    "requests": self._counts[endpoint],
+                    "p50_ms": float(np.percentile(ms, 50)),
+                    "p95_ms": float(np.percentile(ms, 95)),
+                    "p99_ms": float(np.percentile(ms, 99)),
+                    "max_ms": float(ms.max()),
+                }
+            return summary
+
+
+class RecognitionService:
+    """
+    Owns the models and the two batchers (frames -> detector, crops -> ArcFace)
+    """
+
+    def __init__(self, yolo_path, gallery_path, threshold=RECOGNITION_THRESHOLD,
+                 max_batch=32, max_wait_ms=5.0, detect_max_batch=8, jit_compile=False,
+                 quality_gate=None, timeout=30.0):
+        from ultralytics import YOLO
+        from arcFace import ArcFaceClient
+
+        self.detector = YOLO(yolo_path)
+        self.embedder = ArcFaceClient(optimized=True, jit_compile=jit_compile).model
+        self.gallery = Gallery.load(gallery_path)
+        self.threshold = threshold
+        self.quality_gate = quality_gate
+        # Upper bound on waiting for a batch result, so a stuck model cannot hang handler threads
+        self.timeout = timeout
+        self._skipped = Counter()
+        self._skipped_lock = threading.Lock()
+        self.latency = LatencyStats()
+
+        self.detect_batcher = MicroBatcher(self._detect_batch, detect_max_batch,
+                                           max_wait_ms, name="detect-batcher")
+        self.embed_batcher = MicroBatcher(self._embed_batch, max_batch,
+                                          max_wait_ms, name="embed-batcher")
+
+    def _detect_batch(self, frames):
+        results = self.detector(frames, verbose=False)
+        return [(r.boxes.xyxy.cpu().numpy().astype(int), r.boxes.conf.cpu().numpy())
+                for r in results]
+
+    def _embed_batch(self, faces):
+        return list(self.embedder.predict(np.stack(faces), verbose=False))
+
+    def embed(self, face_img):
+        return self.embed_batcher.submit(preprocess_face(face_img)).result(timeout=self.timeout)
+
+    def recognize(self, frame):
+        boxes, confidences = self.detect_batcher.submit(frame).result(timeout=self.timeout)
+        crops, kept_boxes, skipped = [], [], []
+        for (x1, y1, x2, y2), confidence in zip(boxes, confidences):
+            face_img = frame[max(y1, 0):y2, max(x1, 0):x2]
+            if face_img.size == 0:
+                continue  # Skip empty faces
+            box = [int(x1), int(y1), int(x2), int(y2)]
+            if self.quality_gate is not None:
+                ok, reason, _ = self.quality_gate.check(face_img, confidence)
+                if not ok:
+                    with self._skipped_lock:
+                        self._skipped[reason] += 1
+                    skipped.append({"box": box, "name": None, "distance": None, "skipped": reason})
+                    continue
+            crops.append(face_img)
+            kept_boxes.append(box)
+
+        # Submit every crop first so faces of one frame can share a batch
+        futures = [self.embed_batcher.submit(preprocess_face(c)) for c in crops]
+        embeddings = [f.result(timeout=self.timeout) for f in futures]
+        matches = self.gallery.match(embeddings, self.threshold) if embeddings else []
+        return [
+            {"box": box, "name": name, "distance": distance}
+            for box, (name, distance) in zip(kept_boxes, matches)
+        ] + skipped
+
+    def metrics(self):
+        with self._skipped_lock:
+            skipped = dict(self._skipped)
+        return {
+            "latency": self.latency.summary(),
+            "detect_batch_sizes": self.detect_batcher.batch_size_histogram(),
+            "embed_batch_sizes": self.embed_batcher.batch_size_histogram(),
+            "gallery_size": len(self.gallery),
+            "skipped_faces": skipped,
+        }
+
+
+def _decode_image(body):
+    return cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def make_handler(service):
+
+    class RecognitionHandler(BaseHTTPRequestHandler):
+
+        def _send_json(self, status, payload):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                self._send_json(200, service.metrics())
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            start = time.perf_counter()
+            length = int(self.headers.get("Content-Length", 0))
+            image = _decode_image(self.rfile.read(length))
+            if image is None:
+                self._send_json(400, {"error": "could not decode image"})
+                return
+
+            try:
+                if self.path == "/recognize":
+                    payload = {"faces": service.recognize(image)}
+                elif self.path == "/embed":
+                    payload = {"embedding": service.embed(image).tolist()}
+                else:
+                    self._send_json(404, {"error": "not found"})
+                    return
+            except Exception as e:
+                # Failures (including timeouts) count towards latency, under their own key
+                service.latency.record(self.path + " (failed)", time.perf_counter() - start)
+                self._send_json(500, {"error": str(e) or type(e).__name__})
+                return
+            service.latency.record(self.path, time.perf_counter() - start)
+            self._send_json(200, payload)
+
+        def log_message(self, format, *args):
+            pass  # one line per frame from 20+ cameras is too noisy
+
+    return RecognitionHandler
+
+
+class RecognitionClient:
+    """
+    Minimal client for camera loops:
+        client = RecognitionClient()
+        for face in client.recognize(frame): ...
+    """
+
+    def __init__(self, url="http://127.0.0.1:8765", jpeg_quality=90):
+        self.url = url.rstrip("/")
+        self.jpeg_quality = jpeg_quality
+
+    def _post(self, path, image):
+        ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            raise ValueError("Could not encode image")
+        request = urllib.request.Request(
+            self.url + path, data=encoded.tobytes(),
+            headers={"Content-Type": "image/jpeg"}, method="POST",
+        )
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
+
+    def recognize(self, frame):
+        return self._post("/recognize", frame)["faces"]
+
+    def embed(self, face_img):
+        return np.array(self._post("/embed", face_img)["embedding"], dtype=np.float32)
+
+    def metrics(self):
+        with urllib.request.urlopen(self.url + "/metrics") as response:
+            return json.loads(response.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared face recognition server for many camera streams.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--yolo", default="YoloV8 Face.pt")
+    parser.add_argument("--gallery", default="Face Recognition.csv",
+                        help="Enrollment CSV or a compacted .npz from compact_gallery.py.")
+    parser.add_argument("--threshold", type=float, default=RECOGNITION_THRESHOLD)
+    parser.add_argument("--max-batch", type=int, default=32, help="Max face crops per ArcFace batch.")
+    parser.add_argument("--detect-max-batch", type=int, default=8, help="Max frames per YOLO batch.")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0,
+                        help="How long a batch waits for more items after the first one.")
+    parser.add_argument("--jit", action="store_true", help="XLA-compile the ArcFace graph.")
+    parser.add_argument("--timeout", type=float, default=30.0,
+                        help="Seconds a request waits for its batch before failing.")
+    parser.add_argument("--no-quality-gate", action="store_true",
+                        help="Embed every detected face, however small or blurred.")
+    parser.add_argument("--min-face-size", type=int, default=40)
+    parser.add_argument("--min-sharpness", type=float, default=60.0)
+    args = parser.parse_args()
+
+    service = RecognitionService(
+        args.yolo, args.gallery, threshold=args.threshold, max_batch=args.max_batch,
+        max_wait_ms=args.max_wait_ms, detect_max_batch=args.detect_max_batch,
+        jit_compile=args.jit, timeout=args.timeout,
+        quality_gate=None if args.no_quality_gate else QualityGate(
+            min_size=args.min_face_size, min_sharpness=args.min_sharpness),
+    )
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"Recognition server listening on http://{args.host}:{args.port} "
+          f"({len(service.gallery)} known embeddings).")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,9 @@ import tensorflow as tf
 from tensorflow.keras.preprocessing import image
 from tensorflow.keras.applications.mobilenet_v2 import preprocess_input # <-- إضافة جديدة
 import os
+import argparse
+import threading
+from PIL import Image
 
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
 
@@ -11,13 +14,21 @@ MODEL_PATH = "C:/Users/ADMIN/Desktop/MyOrganizerProject/my_final_model.h5"
 
 CLASS_NAMES = ['bike', 'cars', 'cats', 'document', 'dogs', 'flowers', 'horses', 'human']
 
+# Cascade (opt-in): a low-resolution copy of the same network answers first, and only
+# images whose top-class probability is below the threshold go to the 224x224 model.
+# The threshold is a starting point; check it with evaluate_cascade before enabling.
+CASCADE_INPUT_SIZE = 128
+CASCADE_THRESHOLD = 0.90
+FULL_INPUT_SIZE = 224
+
 print("INFO: Loading custom classification model...")
 try:
     model = tf.keras.models.load_model(MODEL_PATH)
     print("INFO: Custom model loaded successfully.")
 except Exception as e:
     print(f"ERROR: Could not load the model from '{MODEL_PATH}'. Details: {e}")
-    exit()
+    # Raised rather than exit(), so importers (e.g. engine workers) can report it
+    raise RuntimeError(f"Could not load the model from '{MODEL_PATH}'. Details: {e}") from e
 
 def prepare_image(img_path, target_size=(224, 224)):
     """تحميل الصورة ومعالجتها بما في ذلك preprocess_input"""
@@ -37,4 +48,116 @@ def classify_image(img_path):
         return predicted_class_name
     except Exception as e:
         print(f"ERROR: Could not process image '{os.path.basename(img_path)}'. Details: {e}")
-        return 'Error_Files'
\ No newline at end of file
+        return 'Error_Files'
+
+
+_low_res_model = None
+# Thread-pool workers may all ask for the cascade model at once; build it only once
+_low_res_model_lock = threading.Lock()
+
+def build_low_res_model(full_model, size=CASCADE_INPUT_SIZE):
+    """Rebuild the trained MobileNetV2 classifier for a smaller input size.
+
+    Convolution weights do not depend on the input resolution, so the backbone
+    is recreated at `size` x `size` and the trained weights are copied over; the
+    classification head (Dense layer) is shared with the full model.
+    """
+    base = next(layer for layer in full_model.layers if layer.name.startswith('mobilenetv2'))
+    low_res_base = tf.keras.applications.MobileNetV2(
+        input_shape=(size, size, 3), include_top=False, weights=None
+    )
+    low_res_base.set_weights(base.get_weights())
+
+    inputs = tf.keras.Input(shape=(size, size, 3))
+    x = low_res_base(inputs, training=False)
+    x = tf.keras.layers.GlobalAveragePooling2D()(x)
+    outputs = full_model.layers[-1](x)
+    return tf.keras.Model(inputs, outputs)
+
+def get_low_res_model():
+    global _low_res_model
+    if _low_res_model is None:
+        with _low_res_model_lock:
+            if _low_res_model is None:
+                print(f"INFO: Building {CASCADE_INPUT_SIZE}x{CASCADE_INPUT_SIZE} cascade model...")
+                _low_res_model = build_low_res_model(model)
+    return _low_res_model
+
+def load_image_once(img_path, min_size=FULL_INPUT_SIZE):
+    """Decode an image once at a reduced scale (JPEG draft mode) for both cascade stages"""
+    img = Image.open(img_path)
+    img.draft('RGB', (min_size, min_size))
+    return img.convert('RGB')
+
+def _to_batch(img, size):
+    # Same nearest-neighbour resize as keras `load_img(target_size=...)`
+    resized = img.resize((size, size), Image.NEAREST)
+    return preprocess_input(np.expand_dims(np.asarray(resized, dtype=np.float32), axis=0))
+
+def _predict(stage_model, batch):
+    # The trained head already ends in softmax, so the output is a probability vector
+    probabilities = stage_model.predict(batch, verbose=0)[0]
+    index = int(np.argmax(probabilities))
+    return CLASS_NAMES[index], float(probabilities[index])
+
+def cascade_classify(img_path, threshold=CASCADE_THRESHOLD):
+    """Classify with the cheap model first and escalate low-confidence images.
+
+    Returns (class_name, confidence, stage) where stage is 'cheap' or 'full'.
+    """
+    img = load_image_once(img_path)
+    class_name, confidence = _predict(get_low_res_model(), _to_batch(img, CASCADE_INPUT_SIZE))
+    if confidence >= threshold:
+        return class_name, confidence, 'cheap'
+    class_name, confidence = _predict(model, _to_batch(img, FULL_INPUT_SIZE))
+    return class_name, confidence, 'full'
+
+def evaluate_cascade(validation_folder, thresholds=(0.7, 0.8, 0.9, 0.95, 0.99)):
+    """Report escalation rate and agreement with the full model on a labelled folder.
+
+    `validation_folder` has one sub-folder per class name (the training layout).
+    Both stages are run on every image once, then each threshold is scored offline.
+    Agreement is measured against `classify_image` (the `load_img` path used
+    without the cascade), not against the cascade's own draft-mode full stage.
+    """
+    records = []
+    for label in sorted(os.listdir(validation_folder)):
+        label_folder = os.path.join(validation_folder, label)
+        if not os.path.isdir(label_folder):
+            continue
+        for filename in os.listdir(label_folder):
+            img_path = os.path.join(label_folder, filename)
+            try:
+                img = load_image_once(img_path)
+            except Exception as e:
+                print(f"WARNING: Skipping '{img_path}'. Details: {e}")
+                continue
+            cheap_name, cheap_confidence = _predict(get_low_res_model(), _to_batch(img, CASCADE_INPUT_SIZE))
+            escalated_name, _ = _predict(model, _to_batch(img, FULL_INPUT_SIZE))
+            full_name, _ = _predict(model, prepare_image(img_path))
+            records.append((label, cheap_name, cheap_confidence, escalated_name, full_name))
+
+    if not records:
+        print(f"ERROR: No images found under '{validation_folder}'.")
+        return
+    total = len(records)
+    full_accuracy = sum(r[0] == r[4] for r in records) / total
+    print(f"Validation images: {total}")
+    print(f"Full model accuracy: {full_accuracy:.2%}")
+    print(f"{'threshold':>10} {'cheap exit':>11} {'escalated':>10} {'agree w/ full':>14} {'accuracy':>9}")
+    for threshold in thresholds:
+        exits = [r for r in records if r[2] >= threshold]
+        cascade_labels = [cheap if conf >= threshold else escalated for _, cheap, conf, escalated, _ in records]
+        agreement = sum(c == r[4] for c, r in zip(cascade_labels, records)) / total
+        accuracy = sum(c == r[0] for c, r in zip(cascade_labels, records)) / total
+        exit_agreement = (sum(r[1] == r[4] for r in exits) / len(exits)) if exits else 1.0
+        print(f"{threshold:>10.2f} {len(exits) / total:>11.2%} {1 - len(exits) / total:>10.2%} "
+              f"{agreement:>14.2%} {accuracy:>9.2%}   (cheap-exit agreement {exit_agreement:.2%})")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Evaluate the confidence-gated classifier cascade.")
+    parser.add_argument('validation_folder', help="Folder with one sub-folder of images per class.")
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[0.7, 0.8, 0.9, 0.95, 0.99])
+    args = parser.parse_args()
+    evaluate_cascade(args.validation_folder, args.thresholds)
@@ -0,0 +1,115 @@
+# dedupe.py
+import cv2
+import numpy as np
+
+# Hashes within this many differing bits (out of 64) are treated as the same photo
+DEFAULT_HAMMING_THRESHOLD = 6
+# Pages sharing a letterhead can be within 6 bits of each other at 64 bits, so
+# results that depend on content (OCR text) are only reused when the 256-bit
+# hash is within this many bits as well, i.e. for re-sent or re-saved copies
+EXACT_HASH_SIZE = 16
+EXACT_HAMMING_THRESHOLD = 2
+
+DUPLICATES_FOLDER = 'duplicates'
+
+
+def _dhash(img, hash_size):
+    small = cv2.resize(img, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    diff = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(diff).tobytes(), 'big')
+
+
+def compute_hashes(image_path):
+    """(64-bit, 256-bit) difference hashes of an image, or None if it cannot be decoded.
+
+    The image is decoded once, directly at 1/8 scale in grayscale (JPEG
+    decoders skip most of the work at that scale), then shrunk to
+    (hash_size+1) x hash_size for each hash; each bit records whether a pixel
+    is brighter than its right neighbour.
+    """
+    img = cv2.imread(image_path, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if img is None:
+        return None
+    return _dhash(img, 8), _dhash(img, EXACT_HASH_SIZE)
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+class BKTree:
+    """Burkhard-Keller tree over hashes for Hamming-radius lookups."""
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, hash_value, item):
+        node = [hash_value, item, {}]
+        self.size += 1
+        if self.root is None:
+            self.root = node
+            return
+        current = self.root
+        while True:
+            distance = hamming_distance(hash_value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def find(self, hash_value, max_distance):
+        """Return (distance, item) pairs within `max_distance`, closest first."""
+        if self.root is None:
+            return []
+        matches = []
+        stack = [self.root]
+        while stack:
+            node_hash, item, children = stack.pop()
+            distance = hamming_distance(hash_value, node_hash)
+            if distance <= max_distance:
+                matches.append((distance, item))
+            # Triangle inequality: only children in [d - r, d + r] can match
+            low, high = distance - max_distance, distance + max_distance
+            stack.extend(child for d, child in children.items() if low <= d <= high)
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+
+class DuplicateDetector:
+    """Finds near-duplicate photos so classification/OCR results can be reused.
+
+    Each representative is stored with a result dict that the caller fills in
+    (the engine uses `name`, `classification` and `ocr` futures; ocr_processor
+    uses `name` and `text`); duplicates get the same dict back.
+    A near-duplicate is good enough to reuse a category; only an `exact` match
+    (256-bit hashes within `exact_threshold` bits) should reuse OCR text.
+    """
+
+    def __init__(self, threshold=DEFAULT_HAMMING_THRESHOLD, exact_threshold=EXACT_HAMMING_THRESHOLD):
+        self.threshold = threshold
+        self.exact_threshold = exact_threshold
+        self.tree = BKTree()
+
+    def find(self, image_path):
+        """Return (hashes, representative result or None, exact) for an image."""
+        return self.lookup(compute_hashes(image_path))
+
+    def lookup(self, hashes):
+        """Like `find` for hashes already computed (e.g. in a worker process)."""
+        if hashes is None:
+            return None, None, False
+        coarse, fine = hashes
+        matches = self.tree.find(coarse, self.threshold)
+        for _, (representative_fine, result) in matches:
+            if hamming_distance(fine, representative_fine) <= self.exact_threshold:
+                return hashes, result, True
+        return hashes, (matches[0][1][1] if matches else None), False
+
+    def add(self, hashes, result):
+        """Register a new representative; `hashes` may be None (undecodable)."""
+        if hashes is not None:
+            coarse, fine = hashes
+            self.tree.add(coarse, (fine, result))
+        return result
@@ -0,0 +1,260 @@
+# destination_planner.py
+import os
+import json
+import time
+import shutil
+import argparse
+import threading
+
+from search_index import forget_documents
+
+JOURNAL_FILENAME = '.organizer_journal.jsonl'
+
+
+class MoveJournal:
+    """Append-only JSON-lines log of every move/rename done by the organizer.
+
+    Each operation is written as a `planned` entry before it runs and a `done`
+    entry after it succeeds, so an interrupted run can be resumed (skip what is
+    already done) or undone (replay `done` entries backwards). Operations are
+    `move`/`rename` (undone by moving back) and `copy`/`create` for files the
+    organizer wrote itself (undone by deleting them; `src` may be None).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+        # Moves queued on a BulkMover are journaled from its worker threads
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _append(self, entry):
+        for key in ('src', 'dst'):
+            if entry[key]:
+                entry[key] = os.path.abspath(entry[key])
+        entry['ts'] = time.time()
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def planned(self, op, src, dst):
+        self._append({'state': 'planned', 'op': op, 'src': src, 'dst': dst})
+
+    def done(self, op, src, dst):
+        self._append({'state': 'done', 'op': op, 'src': src, 'dst': dst})
+
+    def close(self):
+        self._file.close()
+
+
+def read_journal(path):
+    """Return the journal entries of `path` (empty list if it does not exist)."""
+    if not os.path.exists(path):
+        return []
+    entries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A crash can leave a truncated last line; ignore it.
+                print(f"WARNING: Skipping corrupt journal line in '{path}'.")
+    return entries
+
+
+def _completed(path, key, ops):
+    return {os.path.normcase(e[key]) for e in read_journal(path)
+            if e['state'] == 'done' and e[key] and (ops is None or e['op'] in ops)}
+
+
+def completed_destinations(path, ops=None):
+    """Destinations of finished operations (optionally only `ops`), used to resume a run."""
+    return _completed(path, 'dst', ops)
+
+
+def completed_sources(path, ops=None):
+    """Sources of finished operations (optionally only `ops`), used to resume a run."""
+    return _completed(path, 'src', ops)
+
+
+def undo_journal(path, index_dir=None):
+    """Move every finished operation back to its source, newest first.
+
+    Undone destinations are also removed from the OCR search index.
+    """
+    undone = 0
+    forgotten = []
+    for entry in reversed(read_journal(path)):
+        if entry['state'] != 'done':
+            continue
+        src, dst = entry['src'], entry['dst']
+        if entry['op'] in ('copy', 'create'):
+            if os.path.exists(dst):
+                os.remove(dst)
+                forgotten.append(dst)
+                undone += 1
+            continue
+        if not os.path.exists(dst) or os.path.exists(src):
+            print(f"WARNING: Cannot undo '{dst}' -> '{src}'.")
+            continue
+        os.makedirs(os.path.dirname(src) or '.', exist_ok=True)
+        shutil.move(dst, src)
+        forgotten.append(dst)
+        undone += 1
+    forget_documents(forgotten, index_dir)
+    os.replace(path, path + '.undone')
+    return undone
+
+
+class DestinationPlanner:
+    """Hands out unique destination names without probing the disk per file.
+
+    Each output directory is listed once with `os.scandir` into an in-memory
+    name set; later lookups and reservations are dictionary operations.
+    Category directories are created once and then remembered.
+
+    With a `mover` (file_mover.BulkMover), moves and copies are queued on its
+    thread pool and journaled as `done` when they finish; `close()` waits for
+    them. Renames always run synchronously.
+    """
+
+    def __init__(self, journal_path=None, mover=None):
+        self._names = {}
+        self._next_suffix = {}
+        self._created = set()
+        self.journal = MoveJournal(journal_path) if journal_path else None
+        self.mover = mover
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _dir_names(self, directory):
+        key = os.path.normcase(os.path.abspath(directory))
+        names = self._names.get(key)
+        if names is None:
+            names = set()
+            if os.path.isdir(directory):
+                with os.scandir(directory) as entries:
+                    names = {os.path.normcase(entry.name) for entry in entries}
+            self._names[key] = names
+        return names
+
+    def ensure_dir(self, directory):
+        """Create `directory` the first time it is requested."""
+        key = os.path.normcase(os.path.abspath(directory))
+        if key not in self._created:
+            os.makedirs(directory, exist_ok=True)
+            self._created.add(key)
+        return directory
+
+    def unique_name(self, directory, base, extensions):
+        """Reserve `base`, `base_1`, ... so that `base + ext` is free for every ext.
+
+        Returns the chosen base name. The suffix counter for each base name is
+        kept, so thousands of files named `Document` cost O(1) each.
+        """
+        names = self._dir_names(directory)
+        counter_key = (os.path.normcase(os.path.abspath(directory)), base)
+        count = self._next_suffix.get(counter_key, 0)
+        candidate = base if count == 0 else f"{base}_{count}"
+        while any(os.path.normcase(candidate + ext) in names for ext in extensions):
+            count += 1
+            candidate = f"{base}_{count}"
+        self._next_suffix[counter_key] = count + 1
+        for ext in extensions:
+            names.add(os.path.normcase(candidate + ext))
+        return candidate
+
+    def unique_filename(self, directory, filename):
+        """Reserve a free file name in `directory`, keeping the extension."""
+        base, ext = os.path.splitext(filename)
+        return self.unique_name(directory, base, (ext,)) + ext
+
+    def release(self, path):
+        """Forget a name that no longer exists (e.g. the source of a rename)."""
+        directory, name = os.path.split(path)
+        names = self._names.get(os.path.normcase(os.path.abspath(directory)))
+        if names is not None:
+            names.discard(os.path.normcase(name))
+
+    def _journal_done(self, op):
+        def done(src, dst):
+            if self.journal:
+                self.journal.done(op, src, dst)
+        return done
+
+    def move(self, src, dst, op='move'):
+        """Move/rename `src` to `dst` and record it in the journal.
+
+        Returns the mover's Future for a queued move, otherwise None.
+        """
+        if self.journal:
+            self.journal.planned(op, src, dst)
+        self.release(src)
+        if op == 'move' and self.mover is not None:
+            return self.mover.move(src, dst, on_done=self._journal_done(op))
+        if op == 'rename':
+            os.rename(src, dst)
+        else:
+            shutil.move(src, dst)
+        self._journal_done(op)(src, dst)
+        return None
+
+    def copy(self, src, dst):
+        """Byte-exact copy of `src` to `dst` (no re-encoding), journaled as `copy`.
+
+        Returns the mover's Future for a queued copy, otherwise None.
+        """
+        if self.journal:
+            self.journal.planned('copy', src, dst)
+        if self.mover is not None:
+            return self.mover.copy(src, dst, on_done=self._journal_done('copy'))
+        shutil.copy2(src, dst)
+        self._journal_done('copy')(src, dst)
+        return None
+
+    def record(self, op, src, dst):
+        """Journal a file the caller wrote itself (`copy` or `create`)."""
+        if self.journal:
+            self.journal.done(op, src, dst)
+
+    def wait(self):
+        """Block until queued moves and copies have finished."""
+        if self.mover is not None:
+            self.mover.wait()
+
+    def close(self):
+        self.wait()
+        if self.journal:
+            self.journal.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or undo an organizer move journal.")
+    parser.add_argument('command', choices=['show', 'undo'])
+    parser.add_argument('journal', help=f"Path to the journal (usually <output>/{JOURNAL_FILENAME}).")
+    parser.add_argument('--index-dir', help="Local folder holding the search indexes, if not the documents folder.")
+    args = parser.parse_args()
+
+    if args.command == 'show':
+        for entry in read_journal(args.journal):
+            print(f"{entry['state']:8} {entry['op']:7} {entry['src'] or '-'}  >>  {entry['dst']}")
+    else:
+        undone = undo_journal(args.journal, args.index_dir)
+        print(f"INFO: Undid {undone} operations.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,437 @@
+# engine.py
+import os
+import sys
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from dedupe import DuplicateDetector, DUPLICATES_FOLDER, compute_hashes
+from destination_planner import DestinationPlanner, JOURNAL_FILENAME, completed_destinations
+from file_mover import BulkMover
+from search_index import SearchIndex, index_document, forget_document
+from ocr_processor import extract_text_from_image, create_safe_filename_from_text
+
+ALLOWED_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff']
+
+# Must match the classifier's class name; 'Document' only worked on case-insensitive file systems
+DOCUMENTS_FOLDER = 'document'
+
+EXECUTORS = ('serial', 'thread', 'process')
+
+
+def scan_files(folder, recursive=False, skip_dirs=()):
+    """Yield the paths of regular files in `folder` as the directory is read.
+
+    Uses `os.scandir`, so file type comes from the directory entry instead of
+    one `stat` per file, and work can start before the listing is finished.
+    """
+    skip = {os.path.normcase(os.path.abspath(d)) for d in skip_dirs}
+    pending = [folder]
+    while pending:
+        current = pending.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        yield entry.path
+                    elif recursive and entry.is_dir(follow_symlinks=False):
+                        if os.path.normcase(os.path.abspath(entry.path)) not in skip:
+                            pending.append(entry.path)
+        except OSError as e:
+            print(f"WARNING: Could not read folder '{current}'. Details: {e}")
+
+
+# Worker functions are module-level so process pools can pickle them. The classifier
+# is imported lazily, so each worker process loads its own copy of the model once.
+def _import_classifier():
+    # An exit() while loading the model must not unwind the organizer or a pool thread
+    try:
+        import classifier
+    except SystemExit as e:
+        raise RuntimeError("The classifier exited while loading its model.") from e
+    return classifier
+
+
+def load_classifier():
+    """Load the model on a worker; raises if it cannot be loaded."""
+    _import_classifier()
+
+
+def classify_file(path, use_cascade):
+    """Return (category, stage) for one image; stage is 'cheap', 'full' or 'error'."""
+    classifier = _import_classifier()
+    if not use_cascade:
+        category = classifier.classify_image(path)
+        return category, 'error' if category == 'Error_Files' else 'full'
+    try:
+        category, _, stage = classifier.cascade_classify(path)
+        return category, stage
+    except Exception as e:
+        print(f"ERROR: Could not process image '{os.path.basename(path)}'. Details: {e}")
+        return 'Error_Files', 'error'
+
+
+def ocr_file(path):
+    return extract_text_from_image(path)
+
+
+class _SerialExecutor:
+    """Runs submitted work immediately; same interface as concurrent.futures."""
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+def make_executor(kind, workers=None):
+    if kind == 'serial':
+        return _SerialExecutor()
+    if kind == 'thread':
+        return ThreadPoolExecutor(max_workers=workers)
+    if kind == 'process':
+        return ProcessPoolExecutor(max_workers=workers)
+    raise ValueError(f"Unknown executor '{kind}', expected one of {EXECUTORS}")
+
+
+def _print_progress(kind, message, tag='info'):
+    if kind == 'log':
+        print(message)
+
+
+class OrganizerEngine:
+    """Classify photos into category folders, then OCR, rename and index documents.
+
+    Files are streamed from the input folder into a bounded window of at most
+    `max_pending` in-flight jobs on the chosen executor; results are applied
+    (moved, renamed, journaled) in submission order on the calling thread.
+    Duplicate hashes are computed on the executor as well, one window ahead of
+    classification. Progress is reported as `progress(kind, message, tag)` with
+    kind one of 'status', 'log' or 'stats'; `should_stop()` is polled between
+    files. The model is loaded on the executor before scanning; if that fails,
+    the error is logged and `run()` raises RuntimeError with nothing moved. A
+    process pool that breaks later ends the run with the remaining files left
+    in place.
+    Moves run on a separate pool of `move_workers` I/O threads (0 moves on the
+    calling thread), so copying to another disk or share overlaps with
+    classification.
+    """
+
+    def __init__(self, input_folder, output_folder, executor='serial', workers=None,
+                 recursive=False, dedupe=True, route_duplicates=False, use_cascade=False,
+                 run_ocr=True, max_pending=None, progress=None, should_stop=None,
+                 move_workers=8, fsync_batch=0, index_dir=None):
+        self.input_folder = input_folder
+        self.output_folder = output_folder
+        self.executor_kind = executor
+        self.workers = workers or os.cpu_count() or 1
+        self.recursive = recursive
+        self.dedupe = dedupe
+        self.route_duplicates = route_duplicates
+        self.use_cascade = use_cascade
+        self.run_ocr = run_ocr
+        self.max_pending = max_pending or self.workers * 4
+        self.progress = progress or _print_progress
+        self.should_stop = should_stop or (lambda: False)
+        self.move_workers = move_workers
+        self.fsync_batch = fsync_batch
+        # Keeps the search index on a local disk when the output is a network share
+        self.index_dir = index_dir
+
+        self.processed_count = 0
+        self.pool_broken = False
+        self._count_lock = threading.Lock()
+        self.stage_counts = {'cheap': 0, 'full': 0, 'error': 0, 'duplicate': 0}
+        # Near-duplicates share one result dict (category, OCR text) with their representative
+        self.results_by_path = {}
+        self.routed_duplicates = []
+
+    def run(self):
+        os.makedirs(self.output_folder, exist_ok=True)
+        executor = make_executor(self.executor_kind, self.workers)
+        mover = None
+        try:
+            self._check_classifier(executor)
+            mover = BulkMover(self.move_workers, fsync_batch=self.fsync_batch) if self.move_workers else None
+            # Every move and rename is journaled so an interrupted run can be resumed or undone
+            with DestinationPlanner(os.path.join(self.output_folder, JOURNAL_FILENAME), mover=mover) as planner:
+                self.classify_and_move(executor, planner)
+                if self.run_ocr and not self._stopped():
+                    self.ocr_documents(executor, planner)
+        finally:
+            executor.shutdown(wait=True)
+            if mover is not None:
+                mover.close()
+
+    # Step 1: Classification & Moving Files
+    def classify_and_move(self, executor, planner):
+        self.progress('status', "Starting photo organization...", 'info')
+        self.progress('log', "=" * 50, 'info')
+        self.progress('log', "Starting The Ultimate Photo Organizer...", 'info')
+        self.progress('log', "=" * 50, 'info')
+
+        detector = DuplicateDetector() if self.dedupe else None
+        hashing, window = deque(), deque()
+        for source_path in scan_files(self.input_folder, self.recursive, skip_dirs=(self.output_folder,)):
+            if self._stopped():
+                break
+            filename = os.path.basename(source_path)
+            if os.path.splitext(filename)[1].lower() not in ALLOWED_EXTENSIONS:
+                self.progress('log', f"SKIPPED: '{filename}' (Not a recognized image file)", 'warning')
+                continue
+
+            # Hashing decodes the image, so it runs on the executor instead of in front of it
+            hashing.append((source_path, self._submit(executor, compute_hashes, source_path) if detector else None))
+            if len(hashing) >= self.max_pending:
+                window.append(self._classify(executor, detector, *hashing.popleft()))
+            if len(window) >= self.max_pending:
+                self._finish_move(executor, planner, *window.popleft())
+
+        while hashing and not self._stopped():
+            window.append(self._classify(executor, detector, *hashing.popleft()))
+            if len(window) >= self.max_pending:
+                self._finish_move(executor, planner, *window.popleft())
+        while window and not self._stopped():
+            self._finish_move(executor, planner, *window.popleft())
+        # OCR scans the documents folder, so every queued move must have landed
+        planner.wait()
+
+        if self.pool_broken:
+            self.progress('log', "ERROR: The worker pool stopped; remaining files were left in the input folder.", 'error')
+        if self._stopped():
+            return
+        self.progress('log', "\nClassification and Moving Complete!", 'success')
+        if self.use_cascade:
+            classified = self.stage_counts['cheap'] + self.stage_counts['full']
+            if classified:
+                self.progress('log', f"Cascade: {self.stage_counts['cheap']}/{classified} images "
+                              f"({self.stage_counts['cheap'] / classified:.1%}) answered by the cheap stage.", 'info')
+        if self.dedupe:
+            self.progress('log', f"Duplicates reused: {self.stage_counts['duplicate']}", 'info')
+        self.progress('log', "=" * 50, 'info')
+
+    def _check_classifier(self, executor):
+        try:
+            self._submit(executor, load_classifier).result()
+        except Exception as e:
+            self.progress('log', f"ERROR: Could not load the classification model. Details: {e}", 'error')
+            raise RuntimeError(f"Could not load the classification model: {e}") from e
+
+    def _stopped(self):
+        return self.pool_broken or self.should_stop()
+
+    def _submit(self, executor, fn, *args):
+        # A broken pool refuses new work; surface that through the future like any other failure
+        try:
+            return executor.submit(fn, *args)
+        except BrokenProcessPool as e:
+            future = Future()
+            future.set_exception(e)
+            return future
+
+    def _classify(self, executor, detector, source_path, hashes):
+        """Look up the finished hash job and submit classification unless a copy was seen."""
+        filename = os.path.basename(source_path)
+        try:
+            hashes = hashes.result() if hashes is not None else None
+        except BrokenProcessPool:
+            self.pool_broken = True
+            hashes = None
+        _, result, exact = detector.lookup(hashes) if detector else (None, None, False)
+        is_duplicate = result is not None
+        if is_duplicate:
+            self.progress('log', f"DUPLICATE: '{filename}' matches '{result['name']}'", 'info')
+            if not exact:
+                # Reuse the category only; the text may differ (e.g. same letterhead)
+                result = {'name': result['name'], 'classification': result['classification'], 'ocr': None}
+        else:
+            self.progress('status', f"Classifying: {filename}", 'info')
+            result = {'name': filename, 'classification': self._submit(
+                executor, classify_file, source_path, self.use_cascade), 'ocr': None}
+            if detector:
+                detector.add(hashes, result)
+        return source_path, result, is_duplicate
+
+    def _finish_move(self, executor, planner, source_path, result, is_duplicate):
+        filename = os.path.basename(source_path)
+        try:
+            category, stage = result['classification'].result()
+            if is_duplicate and stage == 'error':
+                # The representative could not be classified; this copy gets its own attempt
+                is_duplicate = False
+                result = {'name': filename, 'classification': self._submit(
+                    executor, classify_file, source_path, self.use_cascade), 'ocr': None}
+                category, stage = result['classification'].result()
+        except Exception as e:
+            # Worker-level failures (broken pool, model errors); the file stays where it is
+            self.pool_broken = self.pool_broken or isinstance(e, BrokenProcessPool)
+            self.progress('log', f"ERROR: Could not classify file '{filename}'. Details: {e}", 'error')
+            return
+        self.stage_counts['duplicate' if is_duplicate else stage] += 1
+        folder_name = DUPLICATES_FOLDER if is_duplicate and self.route_duplicates else category
+
+        destination_folder = planner.ensure_dir(os.path.join(self.output_folder, folder_name))
+        destination_name = planner.unique_filename(destination_folder, filename)
+        destination_path = os.path.join(destination_folder, destination_name)
+        try:
+            move = planner.move(source_path, destination_path)
+        except OSError as e:
+            self._moved(filename, category, e)
+            return
+        self.results_by_path[os.path.normcase(os.path.abspath(destination_path))] = result
+        if is_duplicate and self.route_duplicates:
+            self.routed_duplicates.append((destination_path, result))
+
+        if move is None:
+            self._moved(filename, category)
+        else:
+            move.add_done_callback(lambda future: self._moved(filename, category, future.exception()))
+
+    # Called on a mover thread when the move was queued
+    def _moved(self, filename, category, error=None):
+        if error is not None:
+            self.progress('log', f"ERROR: Could not move file '{filename}'. Details: {error}", 'error')
+            return
+        self.progress('log', f"MOVED: '{filename}' >> Category: {category}", 'success')
+        with self._count_lock:
+            self.processed_count += 1
+            count = self.processed_count
+        self.progress('stats', f"Files processed: {count}", 'info')
+
+    # Step 2: OCR Processing for Documents Folder
+    def ocr_documents(self, executor, planner):
+        documents_folder = os.path.join(self.output_folder, DOCUMENTS_FOLDER)
+        if os.path.exists(documents_folder):
+            # Images renamed by an earlier (possibly interrupted) run already have their OCR text
+            already_renamed = completed_destinations(planner.journal.path, ops=('rename',))
+            document_paths = [path for path in scan_files(documents_folder)
+                              if os.path.splitext(path)[1].lower() in ALLOWED_EXTENSIONS
+                              and os.path.normcase(os.path.abspath(path)) not in already_renamed]
+
+            self.progress('log', f"Found {len(document_paths)} document images for OCR.", 'info')
+
+            with SearchIndex.for_folder(documents_folder, self.index_dir) as index:
+                window = deque()
+                for image_path in document_paths:
+                    if self._stopped():
+                        break
+                    result = self.results_by_path.get(os.path.normcase(os.path.abspath(image_path)))
+                    reused = result is not None and result['ocr'] is not None
+                    if reused:
+                        future = result['ocr']
+                    else:
+                        self.progress('status', f"Processing OCR: {os.path.basename(image_path)}", 'info')
+                        future = self._submit(executor, ocr_file, image_path)
+                        if result is not None:
+                            result['ocr'] = future
+                    window.append((image_path, future, reused))
+                    if len(window) >= self.max_pending:
+                        self._finish_ocr(planner, index, documents_folder, *window.popleft())
+                while window and not self._stopped():
+                    self._finish_ocr(planner, index, documents_folder, *window.popleft())
+
+        # Routed duplicates of documents get their representative's text next to them
+        for duplicate_path, result in self.routed_duplicates:
+            try:
+                text = result['ocr'].result() if result['ocr'] is not None else ''
+            except BrokenProcessPool:
+                text = ''
+            if text:
+                text_file_path = os.path.splitext(duplicate_path)[0] + '.txt'
+                with open(text_file_path, 'w', encoding='utf-8') as f:
+                    f.write(text)
+                planner.record('create', None, text_file_path)
+
+        self.progress('log', "\n" + "=" * 50, 'info')
+        self.progress('log', "OCR Process Complete!", 'success')
+        self.progress('log', "=" * 50, 'info')
+
+    def _finish_ocr(self, planner, index, documents_folder, image_path, future, reused):
+        filename = os.path.basename(image_path)
+        self.progress('log', f"Processing OCR for: {filename}", 'info')
+        try:
+            text_content = future.result()
+        except BrokenProcessPool as e:
+            self.pool_broken = True
+            self.progress('log', f"  -> OCR ERROR: Could not process '{filename}'. Details: {e}", 'error')
+            return
+        if reused:
+            self.progress('log', "  -> Reusing OCR text of a near-duplicate", 'info')
+        if not text_content.strip():
+            self.progress('log', f"  -> OCR INFO: No text found in '{filename}'.", 'warning')
+            return
+
+        summary_name = create_safe_filename_from_text(text_content)
+
+        # Ensure unique filenames
+        file_extension = os.path.splitext(filename)[1].lower()
+        summary_name = planner.unique_name(documents_folder, summary_name, (file_extension, '.txt'))
+        new_image_filename = summary_name + file_extension
+        new_image_path = os.path.join(documents_folder, new_image_filename)
+
+        # Rename the image file
+        try:
+            planner.move(image_path, new_image_path, op='rename')
+        except OSError as e:
+            self.progress('log', f"ERROR: Could not rename file '{filename}'. Details: {e}", 'error')
+            return
+        forget_document(index, image_path)
+        self.progress('log', f"  -> RENAMED Image to: {new_image_filename}", 'success')
+
+        # Save the text file
+        text_file_path = os.path.join(documents_folder, summary_name + '.txt')
+        with open(text_file_path, 'w', encoding='utf-8') as f:
+            f.write(text_content)
+        planner.record('create', None, text_file_path)
+        index_document(index, new_image_path, text_content, text_file_path)
+        self.progress('log', f"  -> OCR SUCCESS: Saved text to '{summary_name}.txt'", 'success')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless photo organizer: classify, move, OCR and index.")
+    parser.add_argument('input_folder')
+    parser.add_argument('output_folder')
+    parser.add_argument('--executor', choices=EXECUTORS, default='process')
+    parser.add_argument('--workers', type=int, default=None, help="Defaults to the number of CPUs.")
+    parser.add_argument('--recursive', action='store_true', help="Also scan sub-folders of the input folder.")
+    parser.add_argument('--no-dedupe', action='store_true')
+    parser.add_argument('--route-duplicates', action='store_true',
+                        help=f"Move near-duplicates to '{DUPLICATES_FOLDER}' instead of their category.")
+    parser.add_argument('--cascade', action='store_true',
+                        help="Answer confident images with the 128x128 model; validate the threshold "
+                             "with `python classifier.py <validation folder>` first.")
+    parser.add_argument('--no-ocr', action='store_true', help="Only classify and move.")
+    parser.add_argument('--move-workers', type=int, default=8,
+                        help="I/O threads for moving files (0 moves on the main thread).")
+    parser.add_argument('--fsync-batch', type=int, default=0,
+                        help="fsync cross-device copies in groups of N before deleting the sources (0 = never).")
+    parser.add_argument('--index-dir', help="Local folder for the search index (default: inside the documents folder).")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.input_folder):
+        print(f"ERROR: Input folder '{args.input_folder}' not found.")
+        return
+
+    engine = OrganizerEngine(
+        args.input_folder, args.output_folder,
+        executor=args.executor, workers=args.workers, recursive=args.recursive,
+        dedupe=not args.no_dedupe, route_duplicates=args.route_duplicates,
+        use_cascade=args.cascade, run_ocr=not args.no_ocr,
+        move_workers=args.move_workers, fsync_batch=args.fsync_batch, index_dir=args.index_dir,
+    )
+    try:
+        engine.run()
+    except RuntimeError:
+        sys.exit(1)  # already logged
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+# file_mover.py
+import os
+import time
+import errno
+import shutil
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Errors that retrying will not fix
+_PERMANENT_ERRORS = (FileNotFoundError, FileExistsError, IsADirectoryError, NotADirectoryError)
+
+
+def _copy_file_range(src_fd, dst_fd, chunk_size):
+    """Kernel-side copy (reflink/server-side copy on NFS, SMB, btrfs, XFS)."""
+    while os.copy_file_range(src_fd, dst_fd, chunk_size) > 0:
+        pass
+
+
+def copy_bytes(src, dst, chunk_size=COPY_CHUNK_SIZE, fsync=False):
+    """Byte-exact copy of `src` to `dst` (timestamps preserved).
+
+    Tries `os.copy_file_range` first, then falls back to `shutil.copyfile`,
+    which uses `sendfile` on Linux and `fcopyfile` on macOS.
+    """
+    copied = False
+    if hasattr(os, 'copy_file_range'):
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                _copy_file_range(fsrc.fileno(), fdst.fileno(), chunk_size)
+                if fsync:
+                    os.fsync(fdst.fileno())
+            copied = True
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+    if not copied:
+        shutil.copyfile(src, dst)
+        if fsync:
+            _fsync_file(dst)
+    shutil.copystat(src, dst)
+
+
+def _fsync_file(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _fsync_directory(path):
+    if os.name == 'nt':
+        return  # directories cannot be opened for fsync on Windows
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class BulkMover:
+    """Moves and copies files on a thread pool so disk/network I/O overlaps with inference.
+
+    A move is a plain `os.rename` when source and destination are on the same
+    device; the first cross-device failure for a (source dir, destination dir)
+    pair is remembered, and later files go straight to a parallel copy
+    followed by deleting the source.
+
+    fsync_batch controls durability for cross-device moves:
+        0  no fsync (the OS flushes eventually)
+        1  fsync each copy before deleting its source
+        N  fsync copies in groups of N; sources are deleted only after their
+           group has been synced, so a crash never loses both copies
+    A move or copy only counts as done (`on_done` runs, the future resolves)
+    once its source is deleted, so with N > 1 that happens at the group sync.
+    """
+
+    def __init__(self, workers=8, retries=3, retry_delay=0.5, fsync_batch=0,
+                 chunk_size=COPY_CHUNK_SIZE):
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.fsync_batch = fsync_batch
+        self.chunk_size = chunk_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='mover')
+        self._jobs = set()
+        self._cross_device = set()
+        self._pending_sync = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def move(self, src, dst, on_done=None):
+        """Queue a move; returns a Future that resolves to `dst`.
+
+        `on_done(src, dst)` runs on the worker thread after a successful move,
+        before the future resolves (used to journal the move).
+        """
+        return self._submit(self._move, src, dst, on_done)
+
+    def copy(self, src, dst, on_done=None):
+        """Queue a byte-exact copy (the original format is kept); returns a Future."""
+        return self._submit(self._copy, src, dst, on_done)
+
+    def _submit(self, fn, src, dst, on_done):
+        # The caller's future is separate from the pool job: with batched fsync
+        # the job ends after the copy, the future only after the group sync
+        future = Future()
+        job = self._executor.submit(self._run, fn, src, dst, on_done, future)
+        with self._lock:
+            self._jobs.add(job)
+        job.add_done_callback(self._discard)
+        return future
+
+    def _discard(self, job):
+        with self._lock:
+            self._jobs.discard(job)
+
+    def _run(self, fn, src, dst, on_done, future):
+        try:
+            remove_src = self._with_retries(fn, src, dst)
+        except Exception as e:
+            future.set_exception(e)
+            return
+        if remove_src is None:
+            self._complete(src, dst, on_done, future)
+        else:
+            self._queue_sync((src, dst, remove_src, on_done, future))
+
+    def _with_retries(self, fn, src, dst):
+        for attempt in range(self.retries + 1):
+            try:
+                return fn(src, dst)
+            except _PERMANENT_ERRORS:
+                raise
+            except OSError as e:
+                if attempt == self.retries:
+                    raise
+                print(f"WARNING: Retrying '{src}' after error: {e}")
+                time.sleep(self.retry_delay * (2 ** attempt))
+
+    def _complete(self, src, dst, on_done, future):
+        try:
+            if on_done is not None:
+                on_done(src, dst)
+        except Exception as e:
+            future.set_exception(e)
+            return
+        future.set_result(dst)
+
+    # _move/_copy return None when finished, or whether the source still has to
+    # be removed once the copy has been synced with its group
+    def _move(self, src, dst):
+        pair = (os.path.dirname(os.path.abspath(src)), os.path.dirname(os.path.abspath(dst)))
+        if pair not in self._cross_device:
+            try:
+                os.rename(src, dst)
+                return None
+            except OSError as e:
+                # EXDEV on POSIX, ERROR_NOT_SAME_DEVICE (17) on Windows
+                if e.errno != errno.EXDEV and getattr(e, 'winerror', None) != 17:
+                    raise
+                with self._lock:
+                    self._cross_device.add(pair)
+        copy_bytes(src, dst, self.chunk_size, fsync=self.fsync_batch == 1)
+        if self.fsync_batch > 1:
+            return True
+        os.remove(src)
+        return None
+
+    def _copy(self, src, dst):
+        copy_bytes(src, dst, self.chunk_size, fsync=self.fsync_batch == 1)
+        return False if self.fsync_batch > 1 else None
+
+    def _queue_sync(self, item):
+        with self._lock:
+            self._pending_sync.append(item)
+            if len(self._pending_sync) < self.fsync_batch:
+                return
+            batch, self._pending_sync = self._pending_sync, []
+        self._sync(batch)
+
+    def _sync(self, batch):
+        """fsync a group of copies and their directories, then remove the sources.
+
+        Runs on whichever thread filled the group, so every error is reported
+        on the future of the file it belongs to and the rest of the group
+        still completes.
+        """
+        errors = {}
+        for i, (_, dst, _, _, _) in enumerate(batch):
+            try:
+                _fsync_file(dst)
+            except OSError as e:
+                errors[i] = e
+        directories = {}
+        for i, (_, dst, _, _, _) in enumerate(batch):
+            directories.setdefault(os.path.dirname(os.path.abspath(dst)), []).append(i)
+        for directory, members in directories.items():
+            try:
+                _fsync_directory(directory)
+            except OSError as e:
+                for i in members:
+                    errors.setdefault(i, e)
+        for i, (src, dst, remove_src, on_done, future) in enumerate(batch):
+            if i in errors:
+                future.set_exception(errors[i])
+                continue
+            if remove_src:
+                try:
+                    os.remove(src)
+                except OSError as e:
+                    future.set_exception(e)
+                    continue
+            self._complete(src, dst, on_done, future)
+
+    def wait(self):
+        """Block until every queued operation has finished and pending syncs are flushed."""
+        while True:
+            with self._lock:
+                jobs = {job for job in self._jobs if not job.done()}
+            if jobs:
+                wait(jobs)
+                continue
+            with self._lock:
+                batch, self._pending_sync = self._pending_sync, []
+            if not batch:
+                break
+            self._sync(batch)
+
+    def close(self):
+        self.wait()
+        self._executor.shutdown(wait=True)
@@ -1,19 +1,20 @@
 import os
-import shutil
 import cv2
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 from threading import Thread
 import queue
+import sqlite3
 from PIL import Image, ImageTk
-from classifier import classify_image
-from ocr_processor import extract_text_from_image, create_safe_filename_from_text
+from engine import OrganizerEngine, DOCUMENTS_FOLDER
+from search_index import SearchIndex
+from dedupe import DUPLICATES_FOLDER
 
 class ModernPhotoOrganizerGUI:
     def __init__(self, root):
         self.root = root
         self.root.title("Ultimate Photo Organizer")
-        self.root.geometry("1000x700")
+        self.root.geometry("1000x850")
         self.root.configure(bg='#f0f0f0')
         
         # Configure style
@@ -33,6 +34,9 @@ class ModernPhotoOrganizerGUI:
         # Variables
         self.input_folder = tk.StringVar()
         self.output_folder = tk.StringVar()
+        self.dedupe_enabled = tk.BooleanVar(value=True)
+        self.route_duplicates = tk.BooleanVar(value=False)
+        self.use_cascade = tk.BooleanVar(value=False)
         self.processing = False
         self.progress_queue = queue.Queue()
         
@@ -110,6 +114,9 @@ class ModernPhotoOrganizerGUI:
         # Control buttons
         self.create_control_section(main_frame)
         
+        # Search section
+        self.create_search_section(main_frame)
+        
         # Progress section
         self.create_progress_section(main_frame)
         
@@ -177,6 +184,17 @@ class ModernPhotoOrganizerGUI:
         ttk.Button(output_path_frame, text="Browse", 
                   command=self.browse_output_folder,
                   style='Secondary.TButton').pack(side=tk.RIGHT)
+        
+        # Duplicate handling
+        dedupe_frame = ttk.Frame(config_frame)
+        dedupe_frame.pack(fill=tk.X, pady=(10, 0))
+        
+        ttk.Checkbutton(dedupe_frame, text="Reuse results for near-duplicate photos",
+                       variable=self.dedupe_enabled).pack(side=tk.LEFT, padx=(0, 20))
+        ttk.Checkbutton(dedupe_frame, text=f"Move duplicates to '{DUPLICATES_FOLDER}' folder",
+                       variable=self.route_duplicates).pack(side=tk.LEFT, padx=(0, 20))
+        ttk.Checkbutton(dedupe_frame, text="Fast cascade classification (validate first)",
+                       variable=self.use_cascade).pack(side=tk.LEFT)
     
     def create_control_section(self, parent):
         """Create control buttons section"""
@@ -218,6 +236,37 @@ class ModernPhotoOrganizerGUI:
                   command=self.open_output_folder,
                   style='Success.TButton').pack(side=tk.RIGHT)
     
+    def create_search_section(self, parent):
+        """Create document search section"""
+        search_frame = ttk.Frame(parent, style='Card.TFrame', padding="20")
+        search_frame.pack(fill=tk.X, pady=(0, 20))
+        
+        # Section title
+        search_title = ttk.Label(search_frame, text="🔎 Search Documents", 
+                                style='Title.TLabel')
+        search_title.pack(anchor=tk.W, pady=(0, 15))
+        
+        # Query entry
+        query_frame = ttk.Frame(search_frame)
+        query_frame.pack(fill=tk.X)
+        
+        self.search_query = tk.StringVar()
+        self.search_entry = ttk.Entry(query_frame, textvariable=self.search_query,
+                                     font=('Consolas', 9))
+        self.search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 10))
+        self.search_entry.bind('<Return>', lambda event: self.search_documents())
+        
+        ttk.Button(query_frame, text="Search",
+                  command=self.search_documents,
+                  style='Primary.TButton').pack(side=tk.RIGHT)
+        
+        # Results list (double-click opens the image)
+        self.search_results = tk.Listbox(search_frame, height=5,
+                                        font=('Consolas', 9),
+                                        bg='#fafafa', fg='#333333')
+        self.search_results.pack(fill=tk.X, pady=(10, 0))
+        self.search_results.bind('<Double-Button-1>', self.open_search_result)
+    
     def create_progress_section(self, parent):
         """Create progress section"""
         progress_frame = ttk.Frame(parent, style='Card.TFrame', padding="20")
@@ -313,6 +362,52 @@ class ModernPhotoOrganizerGUI:
         else:
             messagebox.showwarning("Warning", f"Output folder '{output_path}' does not exist.")
     
+    def search_documents(self):
+        """Search the OCR index of the output Document folder"""
+        query = self.search_query.get().strip()
+        self.search_results.delete(0, tk.END)
+        if not query:
+            return
+        
+        documents_folder = os.path.join(self.output_folder.get(), DOCUMENTS_FOLDER)
+        if not os.path.exists(documents_folder):
+            messagebox.showwarning("Warning", f"Documents folder '{documents_folder}' does not exist.")
+            return
+        
+        # Indexing a large archive can take minutes, so it never runs on the Tk thread
+        self.status_label.configure(text=f"Searching: {query}")
+        search_thread = Thread(target=self.search_documents_background,
+                               args=(documents_folder, query))
+        search_thread.daemon = True
+        search_thread.start()
+    
+    def search_documents_background(self, documents_folder, query):
+        """Background search; results come back through the progress queue"""
+        try:
+            with SearchIndex.for_folder(documents_folder) as index:
+                if index.count() == 0:
+                    # First search on an archive processed before indexing existed
+                    self.progress_queue.put(("log", "Indexing documents folder for search...", "info"))
+                    index.index_folder(documents_folder, progress=lambda indexed: self.progress_queue.put(
+                        ("status", f"Indexing documents: {indexed} pages", "info")))
+                results = index.search(query)
+        except sqlite3.Error as e:
+            self.progress_queue.put(("log", f"ERROR: Search failed. Details: {e}", "error"))
+            self.progress_queue.put(("status", "Search failed", "error"))
+            return
+        self.progress_queue.put(("search_results", results))
+    
+    def open_search_result(self, event=None):
+        """Open the selected search result"""
+        selection = self.search_results.curselection()
+        if not selection:
+            return
+        path = self.search_results.get(selection[0])
+        if os.path.exists(path):
+            os.startfile(path)  # Windows
+        else:
+            messagebox.showwarning("Warning", f"File '{path}' no longer exists.")
+    
     def start_processing(self):
         """Start photo processing in background thread"""
         if self.processing:
@@ -348,111 +443,21 @@ class ModernPhotoOrganizerGUI:
             self.organize_photos()
         except Exception as e:
             self.progress_queue.put(("error", f"Error during processing: {str(e)}"))
-        finally:
+        else:
             self.progress_queue.put(("complete", ""))
     
     def organize_photos(self):
-        """Main photo organization logic (modified for GUI)"""
-        ALLOWED_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff']
-        
-        input_folder = self.input_folder.get()
-        output_folder = self.output_folder.get()
-        
-        self.progress_queue.put(("status", "Starting photo organization..."))
-        self.progress_queue.put(("log", "=" * 50, "info"))
-        self.progress_queue.put(("log", "Starting The Ultimate Photo Organizer...", "info"))
-        self.progress_queue.put(("log", "=" * 50, "info"))
-        
-        # Create output folder if it doesn't exist
-        if not os.path.exists(output_folder):
-            os.makedirs(output_folder)
-        
-        # Get files to process
-        files_to_process = [f for f in os.listdir(input_folder) 
-                           if os.path.isfile(os.path.join(input_folder, f))]
-        
-        self.progress_queue.put(("log", f"Found {len(files_to_process)} files to process.", "info"))
-        
-        processed_count = 0
-        
-        # Step 1: Classification & Moving Files
-        for filename in files_to_process:
-            if not self.processing:
-                break
-                
-            file_extension = os.path.splitext(filename)[1].lower()
-            if file_extension in ALLOWED_EXTENSIONS:
-                source_path = os.path.join(input_folder, filename)
-                
-                self.progress_queue.put(("status", f"Classifying: {filename}"))
-                category = classify_image(source_path)
-                
-                destination_folder = os.path.join(output_folder, category)
-                if not os.path.exists(destination_folder):
-                    os.makedirs(destination_folder)
-                
-                destination_path = os.path.join(destination_folder, filename)
-                shutil.move(source_path, destination_path)
-                
-                self.progress_queue.put(("log", f"MOVED: '{filename}' >> Category: {category}", "success"))
-                processed_count += 1
-                self.progress_queue.put(("stats", f"Files processed: {processed_count}"))
-            else:
-                self.progress_queue.put(("log", f"SKIPPED: '{filename}' (Not a recognized image file)", "warning"))
-        
-        if not self.processing:
-            return
-        
-        self.progress_queue.put(("log", "\nClassification and Moving Complete!", "success"))
-        self.progress_queue.put(("log", "=" * 50, "info"))
-        
-        # Step 2: OCR Processing for Documents Folder
-        documents_folder = os.path.join(output_folder, 'Document')
-        if os.path.exists(documents_folder):
-            document_files = [f for f in os.listdir(documents_folder) 
-                            if f.lower().endswith(tuple(ALLOWED_EXTENSIONS))]
-            
-            self.progress_queue.put(("log", f"Found {len(document_files)} document images for OCR.", "info"))
-            
-            for filename in document_files:
-                if not self.processing:
-                    break
-                    
-                image_path = os.path.join(documents_folder, filename)
-                self.progress_queue.put(("status", f"Processing OCR: {filename}"))
-                self.progress_queue.put(("log", f"Processing OCR for: {filename}", "info"))
-                
-                text_content = extract_text_from_image(image_path)
-                if text_content.strip():
-                    summary_name = create_safe_filename_from_text(text_content)
-                    
-                    # Ensure unique filenames
-                    file_extension = os.path.splitext(filename)[1].lower()
-                    count = 1
-                    base_new_name = summary_name
-                    new_image_filename = summary_name + file_extension
-                    new_image_path = os.path.join(documents_folder, new_image_filename)
-                    while os.path.exists(new_image_path):
-                        summary_name = f"{base_new_name}_{count}"
-                        new_image_filename = summary_name + file_extension
-                        new_image_path = os.path.join(documents_folder, new_image_filename)
-                        count += 1
-                    
-                    # Rename the image file
-                    os.rename(image_path, new_image_path)
-                    self.progress_queue.put(("log", f"  -> RENAMED Image to: {new_image_filename}", "success"))
-                    
-                    # Save the text file
-                    text_file_path = os.path.join(documents_folder, summary_name + '.txt')
-                    with open(text_file_path, 'w', encoding='utf-8') as f:
-                        f.write(text_content)
-                    self.progress_queue.put(("log", f"  -> OCR SUCCESS: Saved text to '{summary_name}.txt'", "success"))
-                else:
-                    self.progress_queue.put(("log", f"  -> OCR INFO: No text found in '{filename}'.", "warning"))
-        
-        self.progress_queue.put(("log", "\n" + "=" * 50, "info"))
-        self.progress_queue.put(("log", "OCR Process Complete!", "success"))
-        self.progress_queue.put(("log", "=" * 50, "info"))
+        """Main photo organization logic (runs the shared engine)"""
+        engine = OrganizerEngine(
+            self.input_folder.get(), self.output_folder.get(),
+            executor='thread',
+            dedupe=self.dedupe_enabled.get(),
+            route_duplicates=self.route_duplicates.get(),
+            use_cascade=self.use_cascade.get(),
+            progress=lambda kind, message, tag: self.progress_queue.put((kind, message, tag)),
+            should_stop=lambda: not self.processing,
+        )
+        engine.run()
     
     def check_queue(self):
         """Check progress queue and update GUI"""
@@ -468,6 +473,11 @@ class ModernPhotoOrganizerGUI:
                     self.status_label.configure(text=item[1])
                 elif item[0] == "stats":
                     self.stats_label.configure(text=item[1])
+                elif item[0] == "search_results":
+                    self.search_results.delete(0, tk.END)
+                    for path in item[1]:
+                        self.search_results.insert(tk.END, path)
+                    self.status_label.configure(text=f"Search: {len(item[1])} matching documents")
                 elif item[0] == "error":
                     self.log_message(item[1], "error")
                     messagebox.showerror("Error", item[1])
@@ -1,13 +1,21 @@
 # organizer.py
 import os
-import shutil
-from classifier import classify_image 
+from engine import OrganizerEngine
 
 
 INPUT_FOLDER = 'input_photos'
 OUTPUT_FOLDER = 'output_photos'
 
-ALLOWED_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff']
+# Near-duplicates reuse their representative's category instead of being classified again
+DEDUPE = True
+ROUTE_DUPLICATES = False  # move duplicates to OUTPUT_FOLDER/duplicates instead of their category
+
+# Answer confident images with the low-resolution model and escalate the rest
+# (off until `python classifier.py <validation folder>` has validated the threshold)
+USE_CASCADE = False
+
+# 'serial', 'thread' or 'process'; see engine.py for the full command-line front end
+EXECUTOR = 'serial'
 
 def organize_photos():
 
@@ -25,34 +33,14 @@ def organize_photos():
         os.makedirs(OUTPUT_FOLDER)
         print(f"INFO: Created output folder at '{OUTPUT_FOLDER}'")
 
-    files_to_process = [f for f in os.listdir(INPUT_FOLDER) if os.path.isfile(os.path.join(INPUT_FOLDER, f))]
-
-    if not files_to_process:
-        print("INFO: Input folder is empty. Nothing to organize.")
-        return
-
-    print(f"Found {len(files_to_process)} files to process.\n")
-
-    for filename in files_to_process:
-        file_extension = os.path.splitext(filename)[1].lower()
-
-        if file_extension in ALLOWED_EXTENSIONS:
-            source_path = os.path.join(INPUT_FOLDER, filename)
-            category = classify_image(source_path)
-
-            destination_folder = os.path.join(OUTPUT_FOLDER, category)
-            if not os.path.exists(destination_folder):
-                os.makedirs(destination_folder)
-
-            destination_path = os.path.join(destination_folder, filename)
-            try:
-                shutil.move(source_path, destination_path)
-                print(f"MOVED: '{filename}'  >>  Category: {category}")
-            except Exception as e:
-                print(f"ERROR: Could not move file '{filename}'. Details: {e}")
-        else:
-            print(f"SKIPPED: '{filename}' (Not a recognized image file)")
+    engine = OrganizerEngine(
+        INPUT_FOLDER, OUTPUT_FOLDER, executor=EXECUTOR,
+        dedupe=DEDUPE, route_duplicates=ROUTE_DUPLICATES, use_cascade=USE_CASCADE,
+        run_ocr=False,
+    )
+    engine.run()
 
+    print(f"Processed {engine.processed_count} files.")
     print("\n" + "-" * 50)
     print("Organization complete!")
     print("-" * 50)
@@ -0,0 +1,300 @@
+# search_index.py
+import os
+import re
+import hashlib
+import sqlite3
+import argparse
+
+INDEX_FILENAME = 'ocr_index.sqlite3'
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.gif')
+
+# SQLite's WAL mode needs shared memory, which network file systems do not provide
+NETWORK_FILESYSTEMS = {'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'sshfs', '9p', 'afs', 'ceph', 'glusterfs'}
+
+# Arabic tashkeel (harakat, tanween, shadda, sukun, superscript alef) and tatweel
+_ARABIC_DIACRITICS = re.compile(r'[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]')
+_ARABIC_LETTER_MAP = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي',
+    'ة': 'ه',
+    'ؤ': 'و',
+    'ئ': 'ي',
+})
+_TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def normalize_text(text):
+    """Normalize Arabic/English text so that indexing and queries agree."""
+    text = _ARABIC_DIACRITICS.sub('', text)
+    text = text.translate(_ARABIC_LETTER_MAP)
+    return text.lower()
+
+
+def is_network_path(path):
+    """Best-effort check whether `path` is on a network share (UNC/mapped drive, NFS, SMB...)."""
+    path = os.path.abspath(path)
+    if os.name == 'nt':
+        if path.startswith('\\\\'):
+            return True
+        import ctypes
+        DRIVE_REMOTE = 4
+        return ctypes.windll.kernel32.GetDriveTypeW(os.path.splitdrive(path)[0] + '\\') == DRIVE_REMOTE
+    try:
+        with open('/proc/mounts', 'r') as f:
+            mounts = [line.split()[1:3] for line in f]
+    except OSError:
+        return False
+    best_mount, best_type = '', ''
+    for mount_point, fs_type in mounts:
+        mount_point = mount_point.replace('\\040', ' ')
+        inside = path == mount_point or path.startswith(mount_point.rstrip('/') + '/')
+        if inside and len(mount_point) > len(best_mount):
+            best_mount, best_type = mount_point, fs_type
+    # FUSE mounts report e.g. 'fuse.sshfs'
+    return best_type.split('.')[-1] in NETWORK_FILESYSTEMS
+
+
+def index_path(folder, index_dir=None):
+    """Where the index of `folder` lives: inside it, or in a local `index_dir`."""
+    if index_dir is None:
+        return os.path.join(folder, INDEX_FILENAME)
+    folder = os.path.abspath(folder)
+    key = hashlib.sha1(os.path.normcase(folder).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(index_dir, f"{os.path.basename(folder) or 'root'}_{key}.sqlite3")
+
+
+def build_match_query(query):
+    """Turn free text into an FTS5 MATCH expression (all words, prefix match)."""
+    tokens = _TOKEN_PATTERN.findall(normalize_text(query))
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+class SearchIndex:
+    """Local full-text index of OCR output, backed by SQLite FTS5.
+
+    WAL journaling is used on local disks; on network shares (where WAL does
+    not work) the default rollback journal is kept. Pass `index_dir` to
+    `for_folder` to keep the index on a local disk instead.
+    """
+
+    def __init__(self, db_path, commit_every=200):
+        self.db_path = db_path
+        self.commit_every = commit_every
+        self._pending = 0
+        # Wait for a concurrent writer (e.g. the organizer's OCR step) instead of failing at once
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        if is_network_path(db_path):
+            print(f"WARNING: '{db_path}' is on a network share; using the rollback journal instead of WAL.")
+            self.conn.execute('PRAGMA journal_mode=DELETE')
+        elif self.conn.execute('PRAGMA journal_mode=WAL').fetchone()[0].lower() != 'wal':
+            print(f"WARNING: WAL is not available for '{db_path}'; using the rollback journal.")
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS documents ('
+            'id INTEGER PRIMARY KEY, '
+            'image_path TEXT UNIQUE NOT NULL, '
+            'text_path TEXT, '
+            'mtime REAL)'
+        )
+        # Only the normalized body is tokenized; paths live in the plain table.
+        # unicode61 splits on Unicode word boundaries, which covers Arabic and English.
+        self.conn.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5('
+            "body, tokenize='unicode61 remove_diacritics 2')"
+        )
+
+    @classmethod
+    def for_folder(cls, folder, index_dir=None, **kwargs):
+        """Open (or create) the index of a documents folder (see `index_path`)."""
+        os.makedirs(folder, exist_ok=True)
+        if index_dir is not None:
+            os.makedirs(index_dir, exist_ok=True)
+        return cls(index_path(folder, index_dir), **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, image_path, text, text_path=None, mtime=None):
+        """Insert or replace the text indexed for one image."""
+        image_path = os.path.abspath(image_path)
+        row = self.conn.execute(
+            'SELECT id FROM documents WHERE image_path = ?', (image_path,)
+        ).fetchone()
+        if row is None:
+            doc_id = self.conn.execute(
+                'INSERT INTO documents (image_path, text_path, mtime) VALUES (?, ?, ?)',
+                (image_path, text_path, mtime),
+            ).lastrowid
+        else:
+            doc_id = row[0]
+            self.conn.execute(
+                'UPDATE documents SET text_path = ?, mtime = ? WHERE id = ?',
+                (text_path, mtime, doc_id),
+            )
+            self.conn.execute('DELETE FROM documents_fts WHERE rowid = ?', (doc_id,))
+        self.conn.execute(
+            'INSERT INTO documents_fts (rowid, body) VALUES (?, ?)',
+            (doc_id, normalize_text(text)),
+        )
+        self._maybe_commit()
+
+    def remove(self, image_path):
+        """Drop an image from the index."""
+        image_path = os.path.abspath(image_path)
+        row = self.conn.execute(
+            'SELECT id FROM documents WHERE image_path = ?', (image_path,)
+        ).fetchone()
+        if row is not None:
+            self.conn.execute('DELETE FROM documents_fts WHERE rowid = ?', (row[0],))
+            self.conn.execute('DELETE FROM documents WHERE id = ?', (row[0],))
+            self._maybe_commit()
+
+    def search(self, query, limit=50):
+        """Return image paths whose OCR text matches every word of the query."""
+        match = build_match_query(query)
+        if not match:
+            return []
+        rows = self.conn.execute(
+            'SELECT d.image_path FROM documents_fts '
+            'JOIN documents d ON d.id = documents_fts.rowid '
+            'WHERE documents_fts MATCH ? ORDER BY rank LIMIT ?',
+            (match, limit),
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def index_folder(self, folder, progress=None):
+        """Index every `<name>.txt` next to a `<name>.<image ext>` in a folder.
+
+        Files whose modification time has not changed since the last run are
+        skipped, so re-running this on a large archive only reads new pages;
+        rows for images of this folder that the listing no longer contains
+        (renamed, undone or deleted) are pruned without extra stat calls.
+        `progress(indexed)` is called at every commit.
+        """
+        known = dict(self.conn.execute('SELECT text_path, mtime FROM documents'))
+        images = {}
+        texts = []
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                base, ext = os.path.splitext(entry.name)
+                ext = ext.lower()
+                if ext == '.txt':
+                    texts.append(entry)
+                elif ext in IMAGE_EXTENSIONS:
+                    images[base] = entry.path
+
+        folder_key = os.path.normcase(os.path.abspath(folder))
+        listed = {os.path.normcase(os.path.abspath(path)) for path in images.values()}
+        for (path,) in self.conn.execute('SELECT image_path FROM documents').fetchall():
+            key = os.path.normcase(path)
+            if os.path.dirname(key) == folder_key and key not in listed:
+                self.remove(path)
+
+        indexed = 0
+        for entry in texts:
+            base = os.path.splitext(entry.name)[0]
+            image_path = images.get(base)
+            if image_path is None:
+                continue
+            text_path = os.path.abspath(entry.path)
+            mtime = entry.stat().st_mtime
+            if known.get(text_path) == mtime:
+                continue
+            try:
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    text = f.read()
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"WARNING: Could not read '{entry.path}'. Details: {e}")
+                continue
+            self.add(image_path, text, text_path=text_path, mtime=mtime)
+            indexed += 1
+            if progress is not None and self._pending == 0:
+                progress(indexed)
+        self.commit()
+        return indexed
+
+    def count(self):
+        return self.conn.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+
+    def commit(self):
+        self.conn.commit()
+        self._pending = 0
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+    def _maybe_commit(self):
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self.commit()
+
+
+def index_document(index, image_path, text, text_path=None):
+    """Add one OCR result to an optional index (no-op when `index` is None)."""
+    if index is None:
+        return
+    try:
+        mtime = os.path.getmtime(text_path) if text_path else None
+        index.add(image_path, text,
+                  text_path=os.path.abspath(text_path) if text_path else None,
+                  mtime=mtime)
+    except sqlite3.Error as e:
+        print(f"WARNING: Could not index '{image_path}'. Details: {e}")
+
+
+def forget_document(index, image_path):
+    """Remove one image from an optional index (no-op when `index` is None)."""
+    if index is None:
+        return
+    try:
+        index.remove(image_path)
+    except sqlite3.Error as e:
+        print(f"WARNING: Could not remove '{image_path}' from the index. Details: {e}")
+
+
+def forget_documents(image_paths, index_dir=None):
+    """Remove images from the index of whichever folder holds them, if it has one."""
+    by_folder = {}
+    for path in image_paths:
+        by_folder.setdefault(os.path.dirname(os.path.abspath(path)), []).append(path)
+    for folder, paths in by_folder.items():
+        if not os.path.exists(index_path(folder, index_dir)):
+            continue
+        with SearchIndex.for_folder(folder, index_dir) as index:
+            for path in paths:
+                forget_document(index, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-text search over OCR output.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--index-dir', help="Local folder holding the index (default: inside the documents folder).")
+
+    index_parser = subparsers.add_parser('index', parents=[common], help="Index the .txt files of a documents folder.")
+    index_parser.add_argument('folder')
+
+    search_parser = subparsers.add_parser('search', parents=[common], help="Search the index of a documents folder.")
+    search_parser.add_argument('folder')
+    search_parser.add_argument('query', nargs='+')
+    search_parser.add_argument('--limit', type=int, default=50)
+
+    args = parser.parse_args()
+    with SearchIndex.for_folder(args.folder, args.index_dir) as index:
+        if args.command == 'index':
+            indexed = index.index_folder(args.folder)
+            print(f"INFO: Indexed {indexed} new or changed documents ({index.count()} total).")
+        else:
+            for path in index.search(' '.join(args.query), limit=args.limit):
+                print(path)
+
+
+if __name__ == '__main__':
+    main()